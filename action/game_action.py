@@ -1,8 +1,10 @@
 from action.action import PlayCard,EndAgentTurn
 
 class GameAction:
-    def __init__(self, card=None):
+    def __init__(self, card=None, hand_index=None):
         self.card = card
+        # position of the card in the hand this action was generated from
+        self.hand_index = hand_index
     def __eq__(self, other):
         return self.card == other.card
     def key(self):
@@ -15,6 +17,9 @@ class GameAction:
     def to_action(self, state):
         if self.card is None:
             return EndAgentTurn()
+        i = self.hand_index
+        if i is not None and i < len(state.hand) and self.is_card(state.hand[i]):
+            return PlayCard(i)
         for i in range(len(state.hand)):
             if self.is_card(state.hand[i]):
                 return PlayCard(i)
@@ -1,6 +1,7 @@
 from __future__ import annotations
 import copy
 import os.path
+import pickle
 from action.game_action import GameAction
 from action.action import Action
 from config import MAX_MANA, Verbose
@@ -33,6 +34,19 @@ class BattleState:
         if nolog:
             battle_state_copy.verbose = Verbose.NO_LOG
         return battle_state_copy
+
+    def snapshot(self) -> bytes:
+        return pickle.dumps(self, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def restore_undeterministic(snapshot: bytes, nolog=True) -> BattleState:
+        # same result as copy_undeterministic on the snapshotted state, but
+        # unpickling is several times cheaper than a deepcopy of the state
+        battle_state_copy: BattleState = pickle.loads(snapshot)
+        random.shuffle(battle_state_copy.draw_pile)
+        if nolog:
+            battle_state_copy.verbose = Verbose.NO_LOG
+        return battle_state_copy
     
     def get_undeterministic_repr_hash(self) -> str:
         import hashlib
@@ -209,10 +223,10 @@ class BattleState:
     def get_actions(self) -> list[GameAction]:
         if self.ended():
             return []
-        options = [c for c in self.hand if c.is_playable(self.game_state, self)]
+        options = [(i, c) for i, c in enumerate(self.hand) if c.is_playable(self.game_state, self)]
         result = []
-        for o in options:
-            act = GameAction((o.name,o.upgrade_count))
+        for i, o in options:
+            act = GameAction((o.name,o.upgrade_count), i)
             if act not in result:
                 result.append(act)
         result.append(GameAction())
@@ -1,7 +1,12 @@
 ﻿from __future__ import annotations
 import math
+from array import array
+import multiprocessing
 import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from agent import Agent
 from battle import BattleState
 from card import Card
@@ -10,25 +15,154 @@ from game import GameState
 from ggpa.ggpa import GGPA
 from config import Verbose
 
+_NO_LOCK = nullcontext()
+# rollouts longer than this are cut off and scored where they stand
+MAX_ROLLOUT_DEPTH = 200
+# sqrt(v) for the visit counts UCB sees in all but the longest searches
+_SQRT = [math.sqrt(v) for v in range(1 << 14)]
+
+
+class SearchOptions:
+    """ Settings shared by every iteration of one search. """
+    __slots__ = ('rollouts', 'pool', 'lock', 'table', 'max_depth', 'play_weight', 'expand_all')
+
+    def __init__(self, rollouts: int = 1, pool: multiprocessing.pool.Pool|None = None,
+                 lock: threading.Lock|nullcontext = _NO_LOCK, table: dict[str, TreeNode]|None = None,
+                 max_depth: int = MAX_ROLLOUT_DEPTH, play_weight: float = 1.0, expand_all: bool = False):
+        # rollouts per evaluated leaf, run on `pool` if given
+        self.rollouts = rollouts
+        self.pool = pool
+        # guards the tree statistics when several threads search one tree
+        self.lock = lock
+        # state hash -> node, lets edges that reach equivalent states share one node
+        self.table = table
+        self.max_depth = max_depth
+        self.play_weight = play_weight
+        self.expand_all = expand_all
+
+
+_DEFAULT_OPTIONS = SearchOptions()
+
 # You only need to modify the TreeNode!
 class TreeNode:
-    def __init__(self, param, parent=None):
-        # children: list of (GameAction, TreeNode)
-        self.children: list[tuple] = []
-        self.parent = parent
-        self.results: list[float] = []
+    # a search allocates one node per iteration; slots avoid a __dict__ each
+    __slots__ = ('child_index', 'child_actions', 'child_nodes', 'child_visits', 'child_total',
+                 'child_pending', 'param')
+
+    def __init__(self, param):
+        # Edge statistics are stored on the parent as parallel arrays, one slot
+        # per child, so UCB scans flat arrays instead of child objects.
+        # child_index: GameAction.card -> slot
+        self.child_index: dict[tuple|None, int] = {}
+        self.child_actions: list = []
+        self.child_nodes: list[TreeNode] = []
+        self.child_visits = array('I')
+        self.child_total = array('d')
+        # descents currently in flight through each edge (virtual loss)
+        self.child_pending = array('I')
         self.param = param
 
-    def step(self, state: BattleState):
-        self.select(state)
+    def step(self, state: BattleState, options: SearchOptions = _DEFAULT_OPTIONS):
+        # descend iteratively, remembering the (node, slot) edges taken for
+        # backpropagation
+        lock = options.lock
+        expand_all = options.expand_all
+        node = self
+        path = []
+        # new edges created together by expand_all, with their rollout totals
+        batch = []
+        while not state.ended():
+            # sampled hands differ between iterations, so untried actions are
+            # checked against the current state rather than cached on the node
+            by_card = {ga.card: ga for ga in state.get_actions()}
+            with lock:
+                child_index = node.child_index
+                unexplored = [ga for card, ga in by_card.items() if card not in child_index]
+                if not unexplored:
+                    i = node.select()
+                    node.child_pending[i] += 1
+
+            if expand_all and len(unexplored) > 1:
+                # give every untried action its own rollout in one pass
+                snapshot = state.snapshot()
+                for ga in unexplored:
+                    sample = BattleState.restore_undeterministic(snapshot)
+                    i = node._add_applied(ga, sample, options)
+                    batch.append((node, i, node.child_nodes[i].evaluate(sample, options)))
+                break
+
+            if unexplored:
+                i = node._add_applied(node.expand(unexplored), state, options)
+                path.append((node, i))
+                node = node.child_nodes[i]
+                # a new edge stops the descent unless it led into an already expanded node
+                if not node.child_nodes:
+                    break
+                continue
+
+            path.append((node, i))
+            # **apply** that action to the sample‐state
+            # prefer this sample's own GameAction, whose hand_index is current
+            ga = node.child_actions[i]
+            node._apply(state, by_card.get(ga.card, ga))
+            node = node.child_nodes[i]
+
+        if batch:
+            totals = [total for _, _, total in batch]
+        else:
+            totals = [node.evaluate(state, options)]
+        rollouts = options.rollouts
+        visits, total = rollouts * len(totals), sum(totals)
+        with lock:
+            for parent, i in path:
+                parent.child_pending[i] -= 1
+                parent.child_visits[i] += visits
+                parent.child_total[i] += total
+            for parent, i, leaf_total in batch:
+                parent.child_pending[i] -= 1
+                parent.child_visits[i] += rollouts
+                parent.child_total[i] += leaf_total
+
+    def _add_applied(self, ga, state: BattleState, options: SearchOptions) -> int:
+        """ Apply the untried action `ga` to `state`, then add its edge and mark
+        it pending. The edge is only published once its node is known, shared
+        through the transposition table if there is one, so other threads never
+        descend into a node that is about to be replaced. Returns the edge's
+        slot, which another thread may have added in the meantime. """
+        self._apply(state, ga)
+        table = options.table
+        key = state.get_undeterministic_repr_hash() if table is not None else None
+        with options.lock:
+            i = self.child_index.get(ga.card)
+            if i is None:
+                child = TreeNode(self.param)
+                if table is not None:
+                    child = table.setdefault(key, child)
+                i = self.add_child(ga, child)
+            self.child_pending[i] += 1
+        return i
+
+    def evaluate(self, state: BattleState, options: SearchOptions) -> float:
+        """ Sum of `options.rollouts` independent rollout results from `state`. """
+        rollouts, pool = options.rollouts, options.pool
+        max_depth, play_weight = options.max_depth, options.play_weight
+        # terminal states score immediately
+        if rollouts == 1 or state.ended():
+            return self.rollout(state, max_depth, play_weight) * rollouts
+        snapshot = state.snapshot()
+        if pool is not None:
+            jobs = [(snapshot, max_depth, play_weight, random.getrandbits(32)) for _ in range(rollouts)]
+            return sum(pool.map(_rollout_worker, jobs))
+        return sum(self.rollout(BattleState.restore_undeterministic(snapshot), max_depth, play_weight)
+                   for _ in range(rollouts))
 
     def get_best(self, state: BattleState):
         best_action = None
         best_avg = -float('inf')
-        for ga, node in self.children:
-            if not node.results:
+        for ga, visits, total in zip(self.child_actions, self.child_visits, self.child_total):
+            if not visits:
                 continue
-            avg = sum(node.results) / len(node.results)
+            avg = total / visits
             if avg > best_avg:
                 best_avg = avg
                 best_action = ga
@@ -36,62 +170,79 @@ class TreeNode:
 
     def print_tree(self, indent=0):
         spacer = ' ' * indent
-        for ga, node in self.children:
-            visits = len(node.results)
-            avg = sum(node.results) / visits if visits else 0.0
+        for ga, node, visits, total in zip(self.child_actions, self.child_nodes, self.child_visits, self.child_total):
+            avg = total / visits if visits else 0.0
             print(f"{spacer}{ga}: visits={visits}, avg={avg:.3f}")
             node.print_tree(indent + 2)
 
-    def select(self, state: BattleState):
-        # 1) terminal? record and stop
-        if state.ended():
-            self.backpropagate(self.score(state))
-            return
-
-        actions = state.get_actions()
-        explored = [ga for ga, _ in self.children]
-        unexplored = [ga for ga in actions if ga not in explored]
-
-        if unexplored:
-            self.expand(state, unexplored)
-        else:
-            # UCB-1 selection
-            total = sum(len(n.results) for _, n in self.children)
-            best_ucb = -float('inf')
-            best_ga = best_node = None
-
-            for ga, node in self.children:
-                v = len(node.results)
-                mean = sum(node.results) / v
-                ucb = mean + self.param * math.sqrt(2 * math.log(total) / v)
-                if ucb > best_ucb:
-                    best_ucb, best_ga, best_node = ucb, ga, node
+    def select(self) -> int:
+        # UCB-1 selection; the exploration term is param * sqrt(2 ln N) / sqrt(v),
+        # so everything but sqrt(v) is computed once per node, and sqrt(v)
+        # comes from a table for small v. Pending descents count as losses so
+        # concurrent threads spread over different branches.
+        sqrt = math.sqrt
+        sqrt_table = _SQRT
+        table_size = len(sqrt_table)
+        visits, totals, pending = self.child_visits, self.child_total, self.child_pending
+        c = self.param * sqrt(2.0 * math.log(sum(visits) + sum(pending)))
+        best_ucb = -float('inf')
+        best = 0
 
-            # **apply** that action to the sample‐state
-            self._apply(state, best_ga)
-            best_node.select(state)
+        for i, (n, w, p) in enumerate(zip(visits, totals, pending)):
+            v = n + p
+            ucb = (w - p) / v + c / (sqrt_table[v] if v < table_size else sqrt(v))
+            if ucb > best_ucb:
+                best_ucb, best = ucb, i
+        return best
 
-    def expand(self, state: BattleState, available: list):
-        ga = random.choice(available)
-        child = TreeNode(self.param, parent=self)
-        self.children.append((ga, child))
+    def expand(self, available: list):
+        # indexing with random() skips random.choice's rejection sampling
+        return available[int(random.random() * len(available))]
 
-        # **apply** that action
-        self._apply(state, ga)
-        result = child.rollout(state)
-        child.backpropagate(result)
+    def add_child(self, ga, child: TreeNode|None = None) -> int:
+        i = len(self.child_nodes)
+        self.child_index[ga.card] = i
+        self.child_actions.append(ga)
+        self.child_nodes.append(child if child is not None else TreeNode(self.param))
+        self.child_visits.append(0)
+        self.child_total.append(0.0)
+        self.child_pending.append(0)
+        return i
 
-    def rollout(self, state: BattleState):
-        while not state.ended():
-            ga = random.choice(state.get_actions())
-            self._apply(state, ga)
+    def rollout(self, state: BattleState, max_depth: int = MAX_ROLLOUT_DEPTH, play_weight: float = 1.0):
+        # Same policy as sampling state.get_actions() uniformly, but works on
+        # hand indices directly: one pass over the hand keeps the first
+        # playable copy of each distinct card, and any draw past the last card
+        # option ends the turn. This skips building GameActions, their O(B^2)
+        # de-duplication and the second hand scan in _apply. Rollouts that
+        # have not ended after max_depth actions are scored as they stand.
+        # Each card option is play_weight times as likely as ending the turn;
+        # at 1.0 this is the uniform policy. Plays that tick_player rejects are
+        # skipped, as in _apply.
+        # The bound methods below are looked up once per rollout rather than
+        # once per action; random stays the module generator so that
+        # random.seed keeps games reproducible.
+        rand = random.random
+        ended = state.ended
+        tick_player = state.tick_player
+        game_state = state.game_state
+        for _ in range(max_depth):
+            if ended():
+                break
+            firsts = {}
+            for idx, c in enumerate(state.hand):
+                key = (c.name, c.upgrade_count)
+                if key not in firsts and c.is_playable(game_state, state):
+                    firsts[key] = idx
+            options = list(firsts.values())
+            r = rand() * (len(options) * play_weight + 1.0)
+            idx = int(r / play_weight)
+            try:
+                tick_player(PlayCard(options[idx]) if idx < len(options) else EndAgentTurn())
+            except AssertionError:
+                continue
         return self.score(state)
 
-    def backpropagate(self, result: float):
-        self.results.append(result)
-        if self.parent:
-            self.parent.backpropagate(result)
-
     def score(self, state: BattleState):
         return state.score()
 
@@ -105,6 +256,18 @@ class TreeNode:
 
         name, upg = ga.card
 
+        # the hand index recorded by get_actions is valid unless the hand has
+        # changed since; check it before falling back to a scan
+        idx = ga.hand_index
+        if idx is not None and idx < len(state.hand):
+            c = state.hand[idx]
+            if c.name == name and c.upgrade_count == upg and c.is_playable(state, state):
+                try:
+                    state.tick_player(PlayCard(idx))
+                except AssertionError:
+                    return
+                return
+
         for idx, c in enumerate(state.hand):
             if c.name == name and c.upgrade_count == upg:
                 if not c.is_playable(state, state):
@@ -119,12 +282,48 @@ class TreeNode:
         state.tick_player(EndAgentTurn())
 
 
+def _rollout_worker(args) -> float:
+    """ Play one random rollout in a worker process. """
+    snapshot, max_depth, play_weight, seed = args
+    random.seed(seed)
+    return TreeNode(0.0).rollout(BattleState.restore_undeterministic(snapshot), max_depth, play_weight)
+
+
+def _search_worker(args) -> list[tuple]:
+    """ Grow an independent tree in a worker process and return its root edges. """
+    snapshot, iterations, param, rollouts, transpositions, max_depth, play_weight, expand_all, seed = args
+    random.seed(seed)
+    root = TreeNode(param)
+    options = SearchOptions(rollouts, table={} if transpositions else None, max_depth=max_depth,
+                            play_weight=play_weight, expand_all=expand_all)
+    for _ in range(iterations):
+        root.step(BattleState.restore_undeterministic(snapshot), options)
+    return list(zip(root.child_actions, root.child_visits, root.child_total))
+
+
 # You do not have to modify the MCTSAgent (but you can)
 class MCTSAgent(GGPA):
-    def __init__(self, iterations: int, verbose: bool, param: float):
+    def __init__(self, iterations: int, verbose: bool, param: float, workers: int = 1, rollouts: int = 1,
+                 threads: int = 1, transpositions: bool = False, max_depth: int = MAX_ROLLOUT_DEPTH,
+                 play_weight: float = 1.0, expand_all: bool = False):
+        for name, value in (("workers", workers), ("rollouts", rollouts), ("threads", threads)):
+            if value < 1:
+                raise ValueError("{} must be at least 1, got {}.".format(name, value))
+        if not 0 < play_weight < math.inf:
+            raise ValueError("play_weight must be positive and finite, got {}.".format(play_weight))
         self.iterations = iterations
         self.verbose = verbose
         self.param = param
+        self.workers = workers
+        self.rollouts = rollouts
+        self.threads = threads
+        self.transpositions = transpositions
+        self.max_depth = max_depth
+        self.play_weight = play_weight
+        self.expand_all = expand_all
+        # worker processes are started on the first parallel search; call
+        # close() once the agent is done with them
+        self.pool = None
 
     # REQUIRED METHOD
     def choose_card(self, game_state: GameState, battle_state: BattleState) -> PlayCard | EndAgentTurn:
@@ -132,16 +331,75 @@ class MCTSAgent(GGPA):
         if len(actions) == 1:
             return actions[0].to_action(battle_state)
 
-        root = TreeNode(self.param)
-        for _ in range(self.iterations):
-            sample = battle_state.copy_undeterministic()
-            root.step(sample)
+        # serialize the state once; every iteration restores a fresh
+        # undeterministic copy from it instead of deep-copying battle_state
+        snapshot = battle_state.snapshot()
+        if self.workers > 1:
+            root = self._parallel_search(snapshot)
+        else:
+            root = TreeNode(self.param)
+            # the transposition table lives for this decision only
+            options = SearchOptions(self.rollouts, table={} if self.transpositions else None,
+                                    max_depth=self.max_depth, play_weight=self.play_weight,
+                                    expand_all=self.expand_all)
+            if self.threads > 1:
+                # tree parallelization: threads share one tree, kept apart by virtual loss
+                options.lock = threading.Lock()
+                def search():
+                    root.step(BattleState.restore_undeterministic(snapshot), options)
+                with ThreadPoolExecutor(self.threads) as executor:
+                    for future in [executor.submit(search) for _ in range(self.iterations)]:
+                        future.result()
+            else:
+                if self.rollouts > 1:
+                    # leaf parallelization: batched rollouts run in worker processes
+                    options.pool = self._get_pool()
+                for _ in range(self.iterations):
+                    root.step(BattleState.restore_undeterministic(snapshot), options)
 
         best = root.get_best(battle_state)
         if self.verbose:
             root.print_tree()
         return best.to_action(battle_state)
 
+    def _parallel_search(self, snapshot: bytes) -> TreeNode:
+        """ Root parallelization: each worker searches its own tree and the
+        root edge statistics are summed into a single shallow tree. """
+        share, extra = divmod(self.iterations, self.workers)
+        jobs = [(snapshot, share + (1 if i < extra else 0), self.param, self.rollouts,
+                 self.transpositions, self.max_depth, self.play_weight, self.expand_all,
+                 random.getrandbits(32))
+                for i in range(self.workers)]
+        root = TreeNode(self.param)
+        for edges in self._get_pool().map(_search_worker, jobs):
+            for ga, visits, total_value in edges:
+                i = root.child_index.get(ga.card)
+                if i is None:
+                    i = root.add_child(ga)
+                root.child_visits[i] += visits
+                root.child_total[i] += total_value
+        return root
+
+    def _get_pool(self) -> multiprocessing.pool.Pool:
+        """ The agent's worker processes, started on first use and reused
+        across decisions: one per root search with -w, else one per rollout. """
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.workers if self.workers > 1 else self.rollouts)
+        return self.pool
+
+    def close(self):
+        """ Shut down the worker processes, if any were started. """
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    # the pool cannot be copied or sent to workers; copies start their own
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['pool'] = None
+        return state
+
     # REQUIRED METHOD: All our scenarios only have one enemy
     def choose_agent_target(self, battle_state: BattleState, list_name: str, agent_list: list[Agent]) -> Agent:
         return agent_list[0]
@@ -8,7 +8,7 @@ import agent
 import random
 from ggpa.human_input import HumanInput
 from ggpa.backtrack import BacktrackBot
-from ggpa.mcts_bot import MCTSAgent
+from ggpa.mcts_bot import MCTSAgent, MAX_ROLLOUT_DEPTH
 from ggpa.random_bot import RandomAgent
 from ggpa.sampling_bot import SamplingAgent
 import argparse
@@ -27,7 +27,7 @@ def get_scenario(name):
     if name == "boss":
         return (65, ["Strike", "Strike", "Defend", "Defend", "Bash", "Bludgeon", "Thunderclap", "Inflame", "PommelStrike", "Offering"], "Donut")
 
-def main(scenario, n, verbose, bot, games, param, israndom):
+def main(scenario, n, verbose, bot, games, param, israndom, workers=1, rollouts=1, threads=1, transpositions=False, max_depth=MAX_ROLLOUT_DEPTH, play_weight=1.0, expand_all=False):
     scores = []
     wins = 0
     agentname = ""
@@ -35,7 +35,7 @@ def main(scenario, n, verbose, bot, games, param, israndom):
         hp, deck, enemy = get_scenario(scenario)
         if bot == "mcts":
             agentname = "MCTS"
-            player = MCTSAgent(n, verbose, param)
+            player = MCTSAgent(n, verbose, param, workers, rollouts, threads, transpositions, max_depth, play_weight, expand_all)
         elif bot == "random":
             agentname = "Random"
             player = RandomAgent()
@@ -52,6 +52,8 @@ def main(scenario, n, verbose, bot, games, param, israndom):
         battle_state = BattleState(game_state, agent.make_enemy(enemy, game_state), verbose=Verbose.LOG if games <= 3 else Verbose.NO_LOG)
         start = time.time()
         battle_state.run()
+        if bot == "mcts":
+            player.close()
         score = battle_state.score()
         if score > 0.999:
             wins += 1
@@ -73,5 +75,12 @@ if __name__ == '__main__':
     parser.add_argument('-g', '--games', type=int, default=1)
     parser.add_argument('-p', '--parameter', type=float, default=0.5)
     parser.add_argument('-r', '--random', action="store_true")
+    parser.add_argument('-w', '--workers', type=int, default=1)
+    parser.add_argument('-k', '--rollouts', type=int, default=1)
+    parser.add_argument('-t', '--threads', type=int, default=1)
+    parser.add_argument('-x', '--transpositions', action="store_true")
+    parser.add_argument('-d', '--depth', type=int, default=MAX_ROLLOUT_DEPTH)
+    parser.add_argument('--play-weight', type=float, default=1.0)
+    parser.add_argument('--expand-all', action="store_true")
     args = parser.parse_args()
-    main(args.scenario, args.iterations, args.verbose, args.bot, args.games, args.parameter, args.random)
\ No newline at end of file
+    main(args.scenario, args.iterations, args.verbose, args.bot, args.games, args.parameter, args.random, args.workers, args.rollouts, args.threads, args.transpositions, args.depth, args.play_weight, args.expand_all)
\ No newline at end of file
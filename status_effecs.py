@@ -1,5 +1,6 @@
 from __future__ import annotations
 from enum import Enum
+from functools import partial
 from config import MAX_STATUS
 from typing import Callable
 from typing import TYPE_CHECKING
@@ -65,11 +66,11 @@ class StatusEffectDefinition:
     
     @staticmethod
     def get_decrease(amount: int = 1) -> Callable[[StatusEffectObject], None]:
-        return lambda x: StatusEffectDefinition.decrease(x, amount)
+        return partial(StatusEffectDefinition.decrease, amount=amount)
     
     @staticmethod
     def get_increase(amount: int = 1):
-        return lambda x: StatusEffectDefinition.increase(x, amount)
+        return partial(StatusEffectDefinition.increase, amount=amount)
     
     @staticmethod
     def remove(se: StatusEffectObject):